@@ -1,66 +1,295 @@
+import functools
+import hashlib
+import itertools
 import json
 import yaml
-from urllib.parse import urlparse, parse_qs
-from typing import Dict, List, Any, Tuple
+from urllib.parse import urlparse, urlsplit, parse_qsl
+from typing import Dict, List, Any, Tuple, Iterator, Optional
 import re
 import argparse
 import os
+from dataclasses import dataclass, field
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib parser
+    orjson = None
+
+try:
+    import ijson
+except ImportError:  # ijson is optional; without it the whole HAR is parsed up front
+    ijson = None
+
+def json_loads(data: Any) -> Any:
+    """Parse JSON, using orjson when it is installed.
+    
+    Input that orjson rejects but the stdlib parser accepts (NaN/Infinity,
+    lone surrogate escapes) is parsed with the stdlib parser instead. One
+    difference remains: orjson decodes integers outside the 64-bit range as
+    floats, so such values are typed "number" rather than "integer".
+    """
+    if orjson is None:
+        return json.loads(data)
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        return json.loads(data)
+
+# Entries are read in batches of this size; the first batch is processed in
+# this process, and once a HAR turns out to have more than one batch the rest
+# are processed in a pool of worker processes
+_PARALLEL_BATCH_SIZE = 500
+
+# Most recently used body schemas, keyed by _body_digest of the body. Only the
+# schemas are kept, not the bodies or their parsed data.
+_SCHEMA_CACHE_SIZE = 256
+_schema_cache = OrderedDict()
+
+# Start of a JSON object or array, after optional JSON whitespace
+_JSON_CONTAINER_START_RE = re.compile(r'[ \t\n\r]*[{\[]')
+
+try:
+    from yaml import CSafeDumper as YamlDumper, CSafeLoader as YamlLoader
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeDumper as YamlDumper, SafeLoader as YamlLoader
+
+class SpecDumper(YamlDumper):
+    """YAML dumper that writes objects occurring more than once in a spec out
+    in full instead of as anchors and aliases."""
+
+    def ignore_aliases(self, data: Any) -> bool:
+        return True
+
+def json_dumps_sorted(data: Any) -> bytes:
+    """Serialize data to canonical (key-sorted) JSON bytes."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+        except orjson.JSONEncodeError:  # e.g. lone surrogates in property names
+            pass
+    return json.dumps(data, sort_keys=True, separators=(',', ':')).encode()
+
+# Path parameter placeholders like /users/{id} or /users/:id
+_PATH_PARAM_RE = re.compile(r'/{([^/]+)}|/:([^/]+)')
+
+# Patterns to identify parameter segments, fused into a single regex. The
+# group that matched (m.lastgroup) is the parameter type; alternatives are
+# tried in order, so earlier types win when a segment fits several.
+_SEGMENT_RE = re.compile(
+    r'^(?:'
+    r'(?P<id>\d+)'  # Numeric IDs
+    r'|(?P<uuid>[a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12})'  # UUIDs
+    r'|(?P<hash>[a-f0-9]{32})'  # MD5-like hashes
+    r'|(?P<token>[a-zA-Z0-9_-]{20,})'  # Long tokens
+    r')$'
+)
+
+# Schemas for scalar values, looked up by exact type (so bool does not need to
+# be checked before its base class int). These leaf dicts are shared by every
+# generated schema and must be treated as read-only; deduplicate_schemas puts
+# copies of them in the spec.
+_SCALAR_SCHEMAS = {
+    bool: {"type": "boolean"},
+    int: {"type": "integer"},
+    float: {"type": "number"},
+    str: {"type": "string"},
+    type(None): {"type": "null"},
+}
+_NULL_SCHEMA = _SCALAR_SCHEMAS[type(None)]
+
+def _looks_like_json(body: Any) -> bool:
+    """Cheap check whether body could be a JSON object or array."""
+    return isinstance(body, str) and _JSON_CONTAINER_START_RE.match(body) is not None
+
+def _is_json_body(body: Any, mime_type: str) -> bool:
+    """Whether a HAR body is worth parsing as JSON: its mimeType mentions json,
+    or it starts like a JSON object or array."""
+    return 'json' in mime_type or _looks_like_json(body)
 
 def extract_schema_from_json(json_str: str) -> Dict:
-    """Extract a JSON schema from a JSON string."""
+    """Extract a JSON schema from a JSON string.
+    
+    Schemas are cached by a digest of the body, so identical bodies are only
+    parsed once. Cached schemas are shared between calls; treat them as
+    read-only.
+    """
+    digest = _body_digest(json_str)
+    schema = _schema_cache.get(digest)
+    if schema is not None:
+        _schema_cache.move_to_end(digest)
+        return schema
+
     try:
-        data = json.loads(json_str)
-        return generate_schema(data)
-    except:
-        return {}
+        data = json_loads(json_str)
+    except (ValueError, TypeError, RecursionError):  # JSONDecodeError is a ValueError
+        schema = {}
+    else:
+        schema = generate_schema(data)
+    _schema_cache[digest] = schema
+    if len(_schema_cache) > _SCHEMA_CACHE_SIZE:
+        _schema_cache.popitem(last=False)
+    return schema
 
 def generate_schema(data: Any) -> Dict:
     """Generate a JSON schema from Python data."""
-    if isinstance(data, dict):
-        properties = {}
-        required = []
-        for key, value in data.items():
-            properties[key] = generate_schema(value)
-            if value is not None:  # Consider non-null values as required
-                required.append(key)
-        return {
-            "type": "object",
-            "properties": properties,
-            "required": required if required else None
-        }
-    elif isinstance(data, list):
-        if data:
-            return {
-                "type": "array",
-                "items": generate_schema(data[0])
+    # Walk the data with an explicit stack instead of recursing. Each entry is
+    # (container, key, value): the schema generated for value is stored at
+    # container[key]. Property slots are created up front so that the
+    # properties keep the order of the source object.
+    root = {}
+    stack = [(root, None, data)]
+    while stack:
+        container, key, value = stack.pop()
+        value_type = type(value)
+        if value_type is dict:
+            properties = dict.fromkeys(value)
+            required = [k for k, v in value.items() if v is not None]  # Consider non-null values as required
+            container[key] = {
+                "type": "object",
+                "properties": properties,
+                "required": required if required else None
             }
-        return {"type": "array"}
-    elif isinstance(data, bool):
-        return {"type": "boolean"}
-    elif isinstance(data, int):
-        return {"type": "integer"}
-    elif isinstance(data, float):
-        return {"type": "number"}
-    elif isinstance(data, str):
-        return {"type": "string"}
-    return {"type": "null"}
+            stack.extend((properties, k, v) for k, v in value.items())
+        elif value_type is list:
+            if value:
+                schema = container[key] = {"type": "array", "items": None}
+                stack.append((schema, "items", value[0]))
+            else:
+                container[key] = {"type": "array"}
+        else:
+            container[key] = _SCALAR_SCHEMAS.get(value_type, _NULL_SCHEMA)
+    return root[None]
+
+def _iter_operation_schemas(spec: Dict) -> Iterator[Tuple[Dict, str]]:
+    """Yield (container, key) for every request/response body schema in a spec."""
+    for methods in spec.get('paths', {}).values():
+        for operation in methods.values():
+            bodies = list(operation.get('responses', {}).values())
+            if operation.get('requestBody'):
+                bodies.append(operation['requestBody'])
+            for body in bodies:
+                for media in body.get('content', {}).values():
+                    if 'schema' in media:
+                        yield media, 'schema'
+
+def _digest_schema(schema: Any, digests: Dict[int, str], counts: Dict[str, int]) -> Any:
+    """Return a canonical form of schema, recording digests of object subtrees.
+
+    Nested object schemas are replaced by their digest in the canonical form,
+    so every subtree is serialized only once.
+    """
+    # Post-order walk with an explicit stack. A dict is pushed once to visit
+    # its children and once more (done=True) to assemble its canonical form
+    # from theirs, which are collected on the results stack.
+    results = []
+    stack = [(schema, False)]
+    while stack:
+        node, done = stack.pop()
+        if type(node) is not dict:
+            results.append(node)
+        elif not done:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node.values()))
+        else:
+            count = len(node)
+            canonical = dict(zip(node, results[len(results) - count:]))
+            del results[len(results) - count:]
+            if node.get('type') == 'object' and node.get('properties'):
+                digest = hashlib.blake2b(json_dumps_sorted(canonical), digest_size=8).hexdigest()
+                digests[id(node)] = digest
+                counts[digest] = counts.get(digest, 0) + 1
+                canonical = {'$digest': digest}
+            results.append(canonical)
+    return results[0]
+
+def _replace_shared_schemas(schema: Any, digests: Dict[int, str], counts: Dict[str, int],
+                            components: Dict) -> Any:
+    """Return schema with object schemas seen more than once replaced by a
+    $ref to components, adding their definitions to components.
+
+    The input schema is left untouched, and the result shares no dicts or
+    lists with it, so it can be modified without affecting cached body
+    schemas or the interned leaf schemas.
+    """
+    # Post-order walk with an explicit stack, like _digest_schema. Entries are
+    # (node, component): a dict is pushed once with component None to visit
+    # it, and once more with component set to assemble it from its children's
+    # results. component is '' for a node that goes back on the results stack,
+    # or the digest of a shared schema seen for the first time, which is built
+    # right away (before its siblings) and stored in components instead.
+    results = []
+    stack = [(schema, None)]
+    while stack:
+        node, component = stack.pop()
+        if component is not None:
+            count = len(node)
+            built = dict(zip(node, results[len(results) - count:]))
+            del results[len(results) - count:]
+            if component:
+                components[component] = built
+            else:
+                results.append(built)
+            continue
+
+        if type(node) is not dict:
+            results.append(list(node) if type(node) is list else node)
+            continue
+        digest = digests.get(id(node))
+        if digest is not None and counts[digest] > 1:
+            results.append({"$ref": f"#/components/schemas/{digest}"})
+            if digest in components:
+                continue
+            components[digest] = None  # Reserve the slot to keep first-seen order
+        elif not any(type(child) is dict or type(child) is list for child in node.values()):
+            results.append(dict(node))
+            continue
+        else:
+            digest = ''
+        stack.append((node, digest))
+        stack.extend((child, None) for child in reversed(node.values()))
+    return results[0]
+
+def deduplicate_schemas(spec: Dict) -> Dict:
+    """Move object schemas that occur more than once into components/schemas.
+
+    Every occurrence is replaced by a $ref named after the schema's content
+    hash, so structurally identical bodies are only written out once. The
+    operations' schema objects themselves are not modified; they are replaced
+    by copies.
+    """
+    digests = {}
+    counts = {}
+    roots = list(_iter_operation_schemas(spec))
+    for container, key in roots:
+        _digest_schema(container[key], digests, counts)
+
+    components = spec.setdefault('components', {}).setdefault('schemas', {})
+    for container, key in roots:
+        container[key] = _replace_shared_schemas(container[key], digests, counts, components)
+    return spec
 
 def extract_path_parameters(url: str) -> List[str]:
     """Extract path parameters from URL patterns."""
     # Look for patterns like /users/{id} or /users/:id
-    path_params = re.findall(r'/{([^/]+)}|/:([^/]+)', url)
+    path_params = _PATH_PARAM_RE.findall(url)
     return [param[0] or param[1] for param in path_params]
 
-def generate_endpoint_description(path: str, method: str, request: Dict, response: Dict) -> str:
-    """Generate a descriptive summary for an endpoint based on its path, method, and data."""
+def generate_endpoint_description(path: str, method: str, request_schema: Dict, response_schema: Dict, status: int) -> str:
+    """Generate a descriptive summary for an endpoint based on its path, method, and data.
+    
+    Args:
+        path: Standardized path of the endpoint
+        method: HTTP method
+        request_schema: Schema of the JSON request body ({} if there is none)
+        response_schema: Schema of the JSON response body ({} if there is none)
+        status: Response status code
+    """
     # Extract resource name from path
     path_parts = [p for p in path.split('/') if p]
     resource = path_parts[-1] if path_parts else 'resource'
     
-    # Get response status and content type
-    status = response.get('status', 200)
-    content_type = response.get('content', {}).get('mimeType', '')
-    
     # Basic description based on HTTP method
     method_desc = {
         'get': 'Retrieve',
@@ -71,36 +300,20 @@ def generate_endpoint_description(path: str, method: str, request: Dict, respons
     }.get(method.lower(), 'Process')
     
     # Analyze request body if present
-    request_body = request.get('postData', {}).get('text', '{}')
-    try:
-        request_data = json.loads(request_body)
-        if isinstance(request_data, dict):
-            fields = list(request_data.keys())
-            if fields:
-                field_desc = f" with fields: {', '.join(fields)}"
-            else:
-                field_desc = ""
-        else:
-            field_desc = ""
-    except:
-        field_desc = ""
+    field_desc = ""
+    if request_schema.get('type') == 'object':
+        fields = list(request_schema['properties'])
+        if fields:
+            field_desc = f" with fields: {', '.join(fields)}"
     
     # Analyze response if present
-    response_body = response.get('content', {}).get('text', '{}')
-    try:
-        response_data = json.loads(response_body)
-        if isinstance(response_data, dict):
-            response_fields = list(response_data.keys())
-            if response_fields:
-                response_desc = f" Returns data with fields: {', '.join(response_fields)}"
-            else:
-                response_desc = ""
-        elif isinstance(response_data, list):
-            response_desc = f" Returns a list of {resource}s"
-        else:
-            response_desc = ""
-    except:
-        response_desc = ""
+    response_desc = ""
+    if response_schema.get('type') == 'object':
+        response_fields = list(response_schema['properties'])
+        if response_fields:
+            response_desc = f" Returns data with fields: {', '.join(response_fields)}"
+    elif response_schema.get('type') == 'array':
+        response_desc = f" Returns a list of {resource}s"
     
     # Build the description
     description = f"{method_desc} {resource}"
@@ -117,6 +330,7 @@ def generate_endpoint_description(path: str, method: str, request: Dict, respons
     
     return description
 
+@functools.lru_cache(maxsize=4096)
 def standardize_path(path: str) -> Tuple[str, Dict[str, str]]:
     """Convert path segments with IDs into OpenAPI path parameters.
     
@@ -131,39 +345,213 @@ def standardize_path(path: str) -> Tuple[str, Dict[str, str]]:
     segments = path.split('/')
     param_mapping = {}
     
-    # Patterns to identify parameter segments
-    patterns = [
-        (r'^\d+$', 'id'),  # Numeric IDs
-        (r'^[a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12}$', 'uuid'),  # UUIDs
-        (r'^[a-f0-9]{32}$', 'hash'),  # MD5-like hashes
-        (r'^[a-zA-Z0-9_-]{20,}$', 'token'),  # Long tokens
-    ]
-    
-    # Process each segment
-    for i, segment in enumerate(segments):
-        if not segment:  # Skip empty segments
-            continue
-            
+    # Process each segment. An absolute path always yields an empty first
+    # segment, which is skipped up front; other empty segments never match a
+    # parameter pattern.
+    first = 1 if path.startswith('/') else 0
+    for i in range(first, len(segments)):
+        segment = segments[i]
+        
         # Check if segment matches any parameter pattern
-        for pattern, param_type in patterns:
-            if re.match(pattern, segment):
-                # Create parameter name based on type and position
-                param_name = f"{param_type}_{i}" if i > 0 else param_type
-                segments[i] = f"{{{param_name}}}"
-                param_mapping[segment] = param_name
-                break
+        match = _SEGMENT_RE.match(segment)
+        if match:
+            param_type = match.lastgroup
+            # Create parameter name based on type and position
+            param_name = f"{param_type}_{i}" if i > 0 else param_type
+            segments[i] = f"{{{param_name}}}"
+            param_mapping[segment] = param_name
     
     return '/'.join(segments), param_mapping
 
+def _body_digest(body: Any) -> Any:
+    """Return a compact digest of a request/response body for deduplication."""
+    if not isinstance(body, str):
+        return body
+    return hashlib.blake2b(body.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+def iter_har_entries(har_file: str) -> Iterator[Dict]:
+    """Yield the entries of a HAR file one at a time.
+
+    Entries are streamed with ijson when it is installed, so only the entry
+    currently being processed is held in memory.
+    """
+    with open(har_file, 'rb') as f:
+        if ijson is not None:
+            yield from ijson.items(f, 'log.entries.item', use_float=True)
+        else:
+            yield from json_loads(f.read()).get('log', {}).get('entries', [])
+
+@dataclass(slots=True)
+class Parameter:
+    """A string-typed, required query or path parameter of an operation."""
+    name: str
+    location: str
+    description: str
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "in": self.location,
+            "required": True,
+            "description": self.description,
+            "schema": {"type": "string"}
+        }
+
+@dataclass(slots=True)
+class Operation:
+    """An OpenAPI operation built from a HAR entry.
+
+    Kept as a slotted object while the HAR is processed and converted to a
+    plain dict with to_dict() when the spec is assembled.
+    """
+    summary: str
+    description: str
+    operation_id: str
+    responses: Dict
+    request_body: Optional[Dict] = None
+    parameters: List[Parameter] = field(default_factory=list)
+
+    def to_dict(self) -> Dict:
+        operation = {
+            "summary": self.summary,
+            "description": self.description,
+            "operationId": self.operation_id,
+            "responses": self.responses
+        }
+        if self.request_body is not None:
+            operation['requestBody'] = self.request_body
+        if self.parameters:
+            operation['parameters'] = [parameter.to_dict() for parameter in self.parameters]
+        return operation
+
+def _entry_key(entry: Dict) -> Tuple:
+    """Key identifying everything process_entry reads from a HAR entry."""
+    request = entry.get('request', {})
+    response = entry.get('response', {})
+    post_data = request.get('postData')
+    content = response.get('content', {})
+    return (
+        request.get('method', 'GET').lower(),
+        request.get('url', ''),
+        response.get('status', 200),
+        response.get('statusText', ''),
+        content.get('mimeType', ''),
+        _body_digest(content.get('text', '{}')),
+        _body_digest(post_data.get('text', '{}')) if post_data else None,
+        post_data.get('mimeType', '') if post_data else None,
+    )
+
+def process_entry(entry: Dict, path_prefix: str = None) -> Optional[Tuple[str, str, 'Operation']]:
+    """Build the OpenAPI operation for a single HAR entry.
+    
+    Args:
+        entry: HAR entry containing 'request' and 'response'
+        path_prefix: Optional path prefix to filter endpoints (e.g., '/api')
+        
+    Returns:
+        Tuple of (standardized_path, method, operation), or None if the
+        entry is skipped. Use operation.to_dict() for the OpenAPI form.
+    """
+    request = entry.get('request', {})
+    response = entry.get('response', {})
+    post_data = request.get('postData')
+    content = response.get('content', {})
+    
+    # Parse URL
+    url = request.get('url', '')
+    parsed_url = urlsplit(url)
+    original_path = parsed_url.path
+    if ';' in original_path:
+        # Drop ;params (e.g. ;jsessionid=...) from the last segment, as urlparse does
+        original_path = urlparse(url).path
+
+    # Skip non-HTTP(S) URLs
+    if not parsed_url.scheme.startswith('http'):
+        return None
+
+    # Skip paths that don't match the prefix if specified
+    if path_prefix and not original_path.startswith(path_prefix):
+        return None
+
+    # Standardize path and get parameter mapping
+    path, param_mapping = standardize_path(original_path)
+
+    # Get HTTP method
+    method = request.get('method', 'GET').lower()
+
+    # Extract the body schemas. Only bodies that can be JSON are parsed;
+    # assets such as HTML, CSS or images get an empty schema without a parse
+    # attempt. So do bare JSON scalars (123, null, "x") whose mimeType doesn't
+    # mention json
+    response_text = content.get('text', '{}')
+    if _is_json_body(response_text, content.get('mimeType') or ''):
+        response_schema = extract_schema_from_json(response_text)
+    else:
+        response_schema = {}
+
+    # Add request body if present
+    request_body = None
+    request_schema = {}
+    if post_data:
+        request_text = post_data.get('text', '{}')
+        if _is_json_body(request_text, post_data.get('mimeType') or ''):
+            request_schema = extract_schema_from_json(request_text)
+        request_body = {
+            "description": "Request body containing the data to be processed",
+            "content": {
+                "application/json": {
+                    "schema": request_schema
+                }
+            }
+        }
+
+    # Generate description
+    description = generate_endpoint_description(path, method, request_schema, response_schema,
+                                                 response.get('status', 200))
+
+    # Collect query parameters
+    parameters = []
+    if parsed_url.query:
+        for param_name in dict(parse_qsl(parsed_url.query)):
+            parameters.append(Parameter(param_name, "query", f"Query parameter: {param_name}"))
+
+    # Collect path parameters from standardization
+    for original_value, param_name in param_mapping.items():
+        parameters.append(Parameter(param_name, "path", f"Path parameter: {param_name} (e.g., {original_value})"))
+
+    # Create operation
+    operation = Operation(
+        summary=f"{method.upper()} {path}",
+        description=description,
+        operation_id=f"{method}_{path.replace('/', '_')}",
+        responses={
+            str(response.get('status', 200)): {
+                "description": response.get('statusText', ''),
+                "content": {
+                    "application/json": {
+                        "schema": response_schema
+                    }
+                }
+            }
+        },
+        request_body=request_body,
+        parameters=parameters,
+    )
+
+    return path, method, operation
+
 def convert_har_to_openapi(har_file: str, path_prefix: str = None) -> Dict:
     """Convert HAR file to OpenAPI specification.
     
+    The returned spec shares no objects with earlier or later conversions, so
+    callers may modify it.
+    
     Args:
         har_file: Path to the HAR file
         path_prefix: Optional path prefix to filter endpoints (e.g., '/api')
     """
-    with open(har_file, 'r') as f:
-        har_data = json.load(f)
+    # Body schemas are only shared within one conversion
+    _schema_cache.clear()
 
     # Initialize OpenAPI spec
     openapi_spec = {
@@ -187,137 +575,181 @@ def convert_har_to_openapi(har_file: str, path_prefix: str = None) -> Dict:
         "security": [{"cookieAuth": []}]
     }
 
-    # Track standardized paths to merge similar endpoints
-    path_mapping = {}
+    # Where each processed entry ended up, keyed by everything its result is
+    # derived from: (path, method), or None if it was skipped. Together with
+    # the key of the operation currently stored for each (path, method), this
+    # lets replays of the same request be skipped without keeping every
+    # operation alive.
+    seen_entries = {}
+    current_keys = {}
 
-    # Process each entry in the HAR file
-    for entry in har_data.get('log', {}).get('entries', []):
-        request = entry.get('request', {})
-        response = entry.get('response', {})
-        
-        # Parse URL
-        url = request.get('url', '')
-        parsed_url = urlparse(url)
-        original_path = parsed_url.path
-        
-        # Skip non-HTTP(S) URLs
-        if not parsed_url.scheme.startswith('http'):
-            continue
+    # Process the HAR file in batches of entries. Files with a single batch
+    # are processed in this process; larger ones are spread over a process pool
+    paths = openapi_spec['paths']
+    entries = iter_har_entries(har_file)
+    if hasattr(os, 'sched_getaffinity'):
+        workers = len(os.sched_getaffinity(0))
+    else:
+        workers = os.cpu_count() or 1
+    executor = None
+    try:
+        for batch_number in itertools.count():
+            batch = list(itertools.islice(entries, _PARALLEL_BATCH_SIZE))
+            if not batch:
+                break
 
-        # Skip paths that don't match the prefix if specified
-        if path_prefix and not original_path.startswith(path_prefix):
-            continue
+            # Only process entries that haven't been seen yet
+            keys = [_entry_key(entry) for entry in batch]
+            pending = {}
+            for entry_key, entry in zip(keys, batch):
+                if entry_key not in seen_entries:
+                    pending.setdefault(entry_key, entry)
 
-        # Standardize path and get parameter mapping
-        path, param_mapping = standardize_path(original_path)
-        
-        # Get HTTP method
-        method = request.get('method', 'GET').lower()
-        
-        # Initialize path if not exists
-        if path not in openapi_spec['paths']:
-            openapi_spec['paths'][path] = {}
-        
-        # Generate description
-        description = generate_endpoint_description(path, method, request, response)
-        
-        # Create operation
-        operation = {
-            "summary": f"{method.upper()} {path}",
-            "description": description,
-            "operationId": f"{method}_{path.replace('/', '_')}",
-            "responses": {
-                str(response.get('status', 200)): {
-                    "description": response.get('statusText', ''),
-                    "content": {
-                        "application/json": {
-                            "schema": extract_schema_from_json(response.get('content', {}).get('text', '{}'))
-                        }
-                    }
-                }
-            }
-        }
+            if executor is None and batch_number > 0 and workers > 1:
+                executor = ProcessPoolExecutor(max_workers=workers)
+            if executor is not None and len(pending) > 1:
+                # One chunk of entries per worker
+                chunksize = -(-len(pending) // workers)
+                results = executor.map(process_entry, pending.values(),
+                                       itertools.repeat(path_prefix), chunksize=chunksize)
+            else:
+                results = (process_entry(entry, path_prefix) for entry in pending.values())
+            batch_results = dict(zip(pending, results))
 
-        # Add request body if present
-        if request.get('postData'):
-            operation['requestBody'] = {
-                "description": "Request body containing the data to be processed",
-                "content": {
-                    "application/json": {
-                        "schema": extract_schema_from_json(request['postData'].get('text', '{}'))
-                    }
-                }
-            }
+            # Merge results in HAR order, so later entries still win
+            for entry_key, entry in zip(keys, batch):
+                if entry_key in batch_results:
+                    result = batch_results[entry_key]
+                else:
+                    location = seen_entries[entry_key]
+                    if location is None or current_keys.get(location) == entry_key:
+                        continue  # Skipped, or its operation is already in place
+                    # A replay whose operation was overwritten in the meantime
+                    result = batch_results[entry_key] = process_entry(entry, path_prefix)
+                if result is None:
+                    seen_entries[entry_key] = None
+                    continue
+
+                # Add operation to path, initializing the path if needed
+                path, method, operation = result
+                seen_entries[entry_key] = (path, method)
+                current_keys[path, method] = entry_key
+                paths.setdefault(path, {})[method] = operation
+    finally:
+        if executor is not None:
+            executor.shutdown()
 
-        # Add query parameters
-        query_params = parse_qs(parsed_url.query)
-        if query_params:
-            operation['parameters'] = []
-            for param_name, param_values in query_params.items():
-                operation['parameters'].append({
-                    "name": param_name,
-                    "in": "query",
-                    "required": True,
-                    "description": f"Query parameter: {param_name}",
-                    "schema": {"type": "string"}
-                })
-
-        # Add path parameters from standardization
-        if param_mapping:
-            if 'parameters' not in operation:
-                operation['parameters'] = []
-            for original_value, param_name in param_mapping.items():
-                operation['parameters'].append({
-                    "name": param_name,
-                    "in": "path",
-                    "required": True,
-                    "description": f"Path parameter: {param_name} (e.g., {original_value})",
-                    "schema": {"type": "string"}
-                })
-
-        # Add operation to path
-        openapi_spec['paths'][path][method] = operation
-
-    return openapi_spec
+    # Convert operations to plain dicts for the spec
+    for methods in openapi_spec['paths'].values():
+        for method, operation in methods.items():
+            methods[method] = operation.to_dict()
+
+    return deduplicate_schemas(openapi_spec)
 
 def merge_openapi_specs(existing_spec: Dict, new_spec: Dict) -> Dict:
-    """Merge two OpenAPI specifications, keeping the existing one as base."""
-    merged = existing_spec.copy()
+    """Merge two OpenAPI specifications, keeping the existing one as base.
     
-    # Merge paths
-    if 'paths' not in merged:
-        merged['paths'] = {}
+    Neither input is modified; only the containers that change are copied.
+    """
+    existing_paths = existing_spec.get('paths') or {}
+    merged_paths = {**existing_paths}
     
     # Add or update paths from new spec
     for path, methods in new_spec.get('paths', {}).items():
-        if path not in merged['paths']:
-            merged['paths'][path] = {}
-        merged['paths'][path].update(methods)
-    
-    # Merge components
-    if 'components' not in merged:
-        merged['components'] = {'schemas': {}, 'securitySchemes': {}}
+        merged_paths[path] = {**existing_paths.get(path, {}), **methods}
     
-    # Merge schemas
-    if 'schemas' in new_spec.get('components', {}):
-        merged['components']['schemas'].update(new_spec['components']['schemas'])
+    # Merge components, including schemas and security schemes
+    existing_components = existing_spec.get('components') or {}
+    new_components = new_spec.get('components', {})
+    merged_components = {
+        **existing_components,
+        'schemas': {**existing_components.get('schemas', {}), **new_components.get('schemas', {})},
+        'securitySchemes': {**existing_components.get('securitySchemes', {}), **new_components.get('securitySchemes', {})},
+    }
     
-    # Merge security schemes
-    if 'securitySchemes' in new_spec.get('components', {}):
-        merged['components']['securitySchemes'].update(new_spec['components']['securitySchemes'])
+    return {**existing_spec, 'paths': merged_paths, 'components': merged_components}
+
+def detect_spec_format(spec_file: str) -> Optional[str]:
+    """Return the format of an existing spec file: 'json' if it starts with
+    '{', 'yaml' otherwise, or None if it is empty."""
+    with open(spec_file, 'rb') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                return 'json' if line.startswith(b'{') else 'yaml'
+    return None
+
+def _ends_with_newline(path: str) -> bool:
+    """Whether a file is empty or ends with a newline."""
+    with open(path, 'rb') as f:
+        if f.seek(0, os.SEEK_END) == 0:
+            return True
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b'\n'
+
+def load_openapi_spec(spec_file: str) -> Dict:
+    """Load an OpenAPI spec file written by this script.
     
-    return merged
+    YAML spec files grown with --append contain one document per run; these
+    are merged in order, so later documents win.
+    """
+    with open(spec_file, 'r') as f:
+        documents = [document for document in yaml.load_all(f, Loader=YamlLoader) if document]
+    if not documents:
+        return {}
+    spec = documents[0]
+    for document in documents[1:]:
+        spec = merge_openapi_specs(spec, document)
+    return spec
+
+def write_openapi_spec(spec: Dict, output: str, output_format: str = 'yaml') -> None:
+    """Write spec to output as a single YAML or JSON document."""
+    with open(output, 'w') as f:
+        if output_format == 'json':
+            if orjson is not None:
+                f.write(orjson.dumps(spec, option=orjson.OPT_INDENT_2).decode())
+            else:
+                json.dump(spec, f, indent=2, ensure_ascii=False)
+        else:
+            yaml.dump(spec, f, Dumper=SpecDumper, sort_keys=False, allow_unicode=True)
 
 def main():
     """Main function to convert HAR to OpenAPI spec."""
     parser = argparse.ArgumentParser(description='Convert HAR file to OpenAPI specification')
     parser.add_argument('--har-file', default='network_requests.har', help='Path to the HAR file')
-    parser.add_argument('--output', default='openapi_spec.yaml', help='Output YAML file path')
+    parser.add_argument('--output', default='openapi_spec.yaml', help='Output file path. After --append, a YAML '
+                        'output holds one document per run until it is merged with --consolidate')
+    parser.add_argument('--format', choices=['yaml', 'json'], default='yaml', help='Output format (default: yaml)')
     parser.add_argument('--path-prefix', help='Filter endpoints by path prefix (e.g., /api)')
-    parser.add_argument('--append', action='store_true', help='Append new endpoints to existing spec file instead of replacing it')
+    parser.add_argument('--append', action='store_true', help='Append new endpoints to existing spec file instead of replacing it '
+                        '(YAML output is appended as an extra document; run --consolidate before using the file '
+                        'with other OpenAPI tools)')
+    parser.add_argument('--consolidate', action='store_true', help='Merge the documents added to the output file by '
+                        '--append into a single OpenAPI document, then exit')
     
     args = parser.parse_args()
     
+    if args.consolidate and not os.path.exists(args.output):
+        print(f"Spec file not found: {args.output}")
+        return
+    
+    appending = args.append and os.path.exists(args.output)
+    
+    # Refuse to append to or consolidate a spec file written in the other
+    # format, rather than mixing formats in one file or silently converting it
+    if args.consolidate or appending:
+        existing_format = detect_spec_format(args.output)
+        if existing_format not in (None, args.format):
+            print(f"{args.output} is a {existing_format.upper()} spec but --format is {args.format}; "
+                  f"rerun with --format {existing_format}")
+            return
+    
+    if args.consolidate:
+        print(f"Consolidating {args.output} into a single OpenAPI document...")
+        write_openapi_spec(load_openapi_spec(args.output), args.output, args.format)
+        print(f"OpenAPI specification has been written to {args.output}")
+        return
+    
     print(f"Converting {args.har_file} to OpenAPI specification...")
     if args.path_prefix:
         print(f"Filtering endpoints with path prefix: {args.path_prefix}")
@@ -325,13 +757,27 @@ def main():
     # Generate new spec
     new_spec = convert_har_to_openapi(args.har_file, args.path_prefix)
     
+    # YAML specs are appended to as a new document in the same stream, so the
+    # existing spec doesn't have to be read and rewritten; --consolidate (or
+    # load_openapi_spec) merges the documents afterwards
+    if appending and args.format == 'yaml':
+        print(f"Appending to existing spec file: {args.output}")
+        needs_newline = not _ends_with_newline(args.output)
+        with open(args.output, 'a') as f:
+            if needs_newline:
+                f.write('\n')  # Keep the document marker on a line of its own
+            yaml.dump_all([new_spec], f, Dumper=SpecDumper, explicit_start=True,
+                          sort_keys=False, allow_unicode=True)
+        print(f"OpenAPI specification has been written to {args.output}")
+        print(f"Run with --consolidate --output {args.output} to merge it into a single document.")
+        return
+    
     # Handle appending to existing file
-    if args.append and os.path.exists(args.output):
+    if appending:
         print(f"Appending to existing spec file: {args.output}")
         try:
-            with open(args.output, 'r') as f:
-                existing_spec = yaml.safe_load(f)
-            final_spec = merge_openapi_specs(existing_spec, new_spec)
+            existing_spec = load_openapi_spec(args.output)
+            final_spec = merge_openapi_specs(existing_spec, new_spec) if existing_spec else new_spec
         except Exception as e:
             print(f"Error reading existing spec file: {e}")
             print("Creating new spec file instead.")
@@ -340,8 +786,7 @@ def main():
         final_spec = new_spec
     
     # Write the final spec
-    with open(args.output, 'w') as f:
-        yaml.dump(final_spec, f, sort_keys=False, allow_unicode=True)
+    write_openapi_spec(final_spec, args.output, args.format)
     
     print(f"OpenAPI specification has been written to {args.output}")
 
@@ -0,0 +1,288 @@
+import contextlib
+import io
+import json
+import math
+import os
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from unittest.mock import patch
+
+import yaml
+
+import har_to_openapi
+
+
+def make_entry(method, url, status=200, body=None, mime_type='application/json', post_body=None,
+               post_mime_type='application/json'):
+    entry = {
+        "request": {"method": method, "url": url, "headers": []},
+        "response": {
+            "status": status,
+            "statusText": "OK",
+            "content": {"mimeType": mime_type, "text": body if body is not None else "{}"}
+        }
+    }
+    if post_body is not None:
+        entry["request"]["postData"] = {"mimeType": post_mime_type, "text": post_body}
+    return entry
+
+
+ADDRESS = {"city": "Paris", "zip": "75001"}
+
+FIXTURE_ENTRIES = [
+    make_entry("GET", "https://example.com/api/users/123?page=2&sort=",
+               body=json.dumps({"id": 123, "name": "Ada", "address": ADDRESS})),
+    make_entry("POST", "https://example.com/api/users", status=201,
+               body=json.dumps({"id": 124, "address": ADDRESS}),
+               post_body=json.dumps({"name": "Bob", "address": ADDRESS})),
+    make_entry("GET", "https://example.com/api/items", body=json.dumps([{"sku": "a"}])),
+    make_entry("GET", "https://example.com/static/app.css", body="body { color: red }", mime_type="text/css"),
+    make_entry("GET", "data:image/png;base64,AAAA", body="AAAA", mime_type="image/png"),
+]
+
+
+def write_har(directory, name, entries):
+    har_file = os.path.join(directory, name)
+    with open(har_file, 'w') as f:
+        json.dump({"log": {"version": "1.2", "entries": entries}}, f)
+    return har_file
+
+
+def response_schema(operation, status='200'):
+    return operation['responses'][status]['content']['application/json']['schema']
+
+
+class TestHarToOpenapi(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.har_file = write_har(self.tmp_dir.name, 'fixture.har', FIXTURE_ENTRIES)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def run_main(self, *args):
+        with patch.object(sys, 'argv', ['har_to_openapi.py', *args]):
+            with contextlib.redirect_stdout(io.StringIO()):
+                har_to_openapi.main()
+
+    def test_json_loads(self):
+        for orjson in (har_to_openapi.orjson, None):
+            with self.subTest(orjson=orjson is not None), patch.object(har_to_openapi, 'orjson', orjson):
+                self.assertEqual(har_to_openapi.json_loads('{"a": [1, 2.5]}'), {"a": [1, 2.5]})
+                self.assertEqual(har_to_openapi.json_loads(b'[true, null]'), [True, None])
+                # Input orjson rejects is parsed by the stdlib parser
+                self.assertTrue(math.isnan(har_to_openapi.json_loads('NaN')))
+                self.assertEqual(har_to_openapi.json_loads('"\\ud800"'), '\ud800')
+                with self.assertRaises(ValueError):
+                    har_to_openapi.json_loads('{"a": ')
+
+    def test_iter_har_entries(self):
+        for ijson in (har_to_openapi.ijson, None):
+            with self.subTest(ijson=ijson is not None), patch.object(har_to_openapi, 'ijson', ijson):
+                self.assertEqual(list(har_to_openapi.iter_har_entries(self.har_file)), FIXTURE_ENTRIES)
+
+    def test_result_can_be_modified(self):
+        spec = har_to_openapi.convert_har_to_openapi(self.har_file)
+        user = spec['paths']['/api/users/{id_3}']['get']
+        response_schema(user)['properties']['name']['format'] = 'date'
+        response_schema(user)['required'].append('extra')
+        user['parameters'][0]['schema']['format'] = 'date'
+
+        self.assertEqual(har_to_openapi._SCALAR_SCHEMAS[str], {"type": "string"})
+        spec = har_to_openapi.convert_har_to_openapi(self.har_file)
+        user = spec['paths']['/api/users/{id_3}']['get']
+        self.assertEqual(response_schema(user)['properties']['name'], {"type": "string"})
+        self.assertEqual(response_schema(user)['required'], ['id', 'name', 'address'])
+        self.assertEqual(user['parameters'][0]['schema'], {"type": "string"})
+
+    def test_replayed_entries(self):
+        entry_a = make_entry("GET", "https://example.com/api/feed", body=json.dumps({"a": 1}))
+        entry_b = make_entry("GET", "https://example.com/api/feed", body=json.dumps({"b": "x"}))
+        har_file = write_har(self.tmp_dir.name, 'replays.har', [entry_a, entry_b, entry_a, entry_a])
+
+        # One entry per batch, so replays are looked up in the seen entries
+        # of earlier batches
+        with patch.object(har_to_openapi, '_PARALLEL_BATCH_SIZE', 1), \
+                patch.object(har_to_openapi.os, 'sched_getaffinity', return_value={0}, create=True), \
+                patch.object(har_to_openapi, 'process_entry', wraps=har_to_openapi.process_entry) as process_entry:
+            spec = har_to_openapi.convert_har_to_openapi(har_file)
+
+        # A is processed again after B overwrote its operation, and wins; the
+        # last replay finds A's operation in place and is skipped
+        self.assertEqual(process_entry.call_count, 3)
+        schema = response_schema(spec['paths']['/api/feed']['get'])
+        self.assertEqual(list(schema['properties']), ['a'])
+
+    def test_process_entry(self):
+        path, method, operation = har_to_openapi.process_entry(FIXTURE_ENTRIES[0])
+        self.assertEqual(path, '/api/users/{id_3}')
+        self.assertEqual(method, 'get')
+
+        operation = operation.to_dict()
+        self.assertEqual(operation['operationId'], 'get__api_users_{id_3}')
+        self.assertEqual(operation['description'],
+                         'Retrieve {id_3} Returns data with fields: id, name, address (Success: 200)')
+        # Query parameters with blank values are left out
+        self.assertEqual([(p['name'], p['in']) for p in operation['parameters']],
+                         [('page', 'query'), ('id_3', 'path')])
+        self.assertEqual(response_schema(operation)['properties']['address']['type'], 'object')
+
+    def test_process_entry_skips_entries(self):
+        self.assertIsNone(har_to_openapi.process_entry(FIXTURE_ENTRIES[4]))
+        self.assertIsNone(har_to_openapi.process_entry(FIXTURE_ENTRIES[0], path_prefix='/other'))
+
+    def test_non_json_body_gets_empty_schema(self):
+        _, _, operation = har_to_openapi.process_entry(FIXTURE_ENTRIES[3])
+        self.assertEqual(response_schema(operation.to_dict()), {})
+
+    def test_null_mime_type(self):
+        entry = make_entry("POST", "https://example.com/api/notes", body='{"id": 1}', mime_type=None,
+                           post_body='"abc"', post_mime_type=None)
+        _, _, operation = har_to_openapi.process_entry(entry)
+        operation = operation.to_dict()
+        self.assertEqual(response_schema(operation)['properties'], {"id": {"type": "integer"}})
+        self.assertEqual(operation['requestBody']['content']['application/json']['schema'], {})
+
+    def test_replays_differing_in_post_mime_type(self):
+        har_file = write_har(self.tmp_dir.name, 'post.har', [
+            make_entry("POST", "https://example.com/api/notes", post_body='"abc"', post_mime_type='text/plain'),
+            make_entry("POST", "https://example.com/api/notes", post_body='"abc"'),
+        ])
+        spec = har_to_openapi.convert_har_to_openapi(har_file)
+        request_body = spec['paths']['/api/notes']['post']['requestBody']
+        self.assertEqual(request_body['content']['application/json']['schema'], {"type": "string"})
+
+    def test_deduplicate_schemas(self):
+        spec = har_to_openapi.convert_har_to_openapi(self.har_file)
+        components = spec['components']['schemas']
+        self.assertEqual(len(components), 1)
+        digest, address_schema = next(iter(components.items()))
+        self.assertEqual(list(address_schema['properties']), ['city', 'zip'])
+
+        ref = {"$ref": f"#/components/schemas/{digest}"}
+        users = spec['paths']['/api/users']['post']
+        self.assertEqual(response_schema(users, '201')['properties']['address'], ref)
+        self.assertEqual(users['requestBody']['content']['application/json']['schema']['properties']['address'], ref)
+        user = spec['paths']['/api/users/{id_3}']['get']
+        self.assertEqual(response_schema(user)['properties']['address'], ref)
+
+    def test_deeply_nested_body(self):
+        depth = 500
+        body = '{"a":' * depth + '1' + '}' * depth
+        har_file = write_har(self.tmp_dir.name, 'deep.har', [
+            make_entry("GET", "https://example.com/api/deep", body=body),
+            make_entry("POST", "https://example.com/api/deep", body=body),
+        ])
+        spec = har_to_openapi.convert_har_to_openapi(har_file)
+        schema = response_schema(spec['paths']['/api/deep']['get'])
+        levels = 0
+        while '$ref' in schema or 'properties' in schema:
+            if '$ref' in schema:
+                schema = spec['components']['schemas'][schema['$ref'].rsplit('/', 1)[1]]
+            schema = schema['properties']['a']
+            levels += 1
+        self.assertEqual(levels, depth)
+        self.assertEqual(schema, {"type": "integer"})
+
+
+    def test_json_output(self):
+        output = os.path.join(self.tmp_dir.name, 'spec.json')
+        self.run_main('--har-file', self.har_file, '--output', output, '--format', 'json')
+        with open(output) as f:
+            written = json.load(f)
+        expected = json.loads(json.dumps(har_to_openapi.convert_har_to_openapi(self.har_file)))
+        self.assertEqual(written, expected)
+
+
+    def test_pool_matches_serial(self):
+        entries = [
+            make_entry("GET", f"https://example.com/api/r{i % 3}/{i}?q={i}", body=json.dumps({"n": i, "v": [i]}))
+            for i in range(12)
+        ]
+        entries += entries[:4]
+        har_file = write_har(self.tmp_dir.name, 'many.har', entries)
+        serial_spec = har_to_openapi.convert_har_to_openapi(har_file)
+
+        with patch.object(har_to_openapi, '_PARALLEL_BATCH_SIZE', 5), \
+                patch.object(har_to_openapi.os, 'sched_getaffinity', return_value={0, 1}, create=True), \
+                patch.object(har_to_openapi, 'ProcessPoolExecutor', wraps=ProcessPoolExecutor) as pool:
+            pool_spec = har_to_openapi.convert_har_to_openapi(har_file)
+        self.assertTrue(pool.called)
+        self.assertEqual(pool_spec, serial_spec)
+
+
+    def test_merge_openapi_specs_does_not_modify_inputs(self):
+        existing_spec = {
+            "openapi": "3.0.0",
+            "paths": {"/a": {"get": {"summary": "old"}}},
+            "components": {"schemas": {"x": {"type": "string"}}, "securitySchemes": {}}
+        }
+        new_spec = {
+            "paths": {"/a": {"post": {"summary": "new"}}, "/b": {"get": {"summary": "b"}}},
+            "components": {"schemas": {"y": {"type": "integer"}}}
+        }
+        existing_copy = json.loads(json.dumps(existing_spec))
+        new_copy = json.loads(json.dumps(new_spec))
+
+        merged = har_to_openapi.merge_openapi_specs(existing_spec, new_spec)
+        self.assertEqual(existing_spec, existing_copy)
+        self.assertEqual(new_spec, new_copy)
+        self.assertEqual(merged['paths'], {
+            "/a": {"get": {"summary": "old"}, "post": {"summary": "new"}},
+            "/b": {"get": {"summary": "b"}}
+        })
+        self.assertEqual(list(merged['components']['schemas']), ['x', 'y'])
+
+
+    def test_append_and_consolidate(self):
+        output = os.path.join(self.tmp_dir.name, 'spec.yaml')
+        extra_har = write_har(self.tmp_dir.name, 'extra.har', [
+            make_entry("GET", "https://example.com/api/orders", body=json.dumps({"total": 1}))
+        ])
+        self.run_main('--har-file', self.har_file, '--output', output)
+        self.run_main('--har-file', extra_har, '--output', output, '--append')
+
+        with open(output) as f:
+            self.assertEqual(len(list(yaml.safe_load_all(f))), 2)
+        spec = har_to_openapi.load_openapi_spec(output)
+        self.assertIn('/api/orders', spec['paths'])
+        self.assertIn('/api/users', spec['paths'])
+
+        self.run_main('--output', output, '--consolidate')
+        with open(output) as f:
+            consolidated = yaml.safe_load(f)
+        self.assertEqual(consolidated, spec)
+
+    def test_append_without_trailing_newline(self):
+        output = os.path.join(self.tmp_dir.name, 'spec.yaml')
+        with open(output, 'w') as f:
+            f.write('openapi: 3.0.0\ninfo:\n  title: Existing')
+        self.run_main('--har-file', self.har_file, '--output', output, '--append')
+
+        with open(output) as f:
+            documents = list(yaml.safe_load_all(f))
+        self.assertEqual(documents[0], {"openapi": "3.0.0", "info": {"title": "Existing"}})
+        self.assertIn('/api/users', documents[1]['paths'])
+
+    def test_format_mismatch_leaves_file_alone(self):
+        output = os.path.join(self.tmp_dir.name, 'spec.json')
+        self.run_main('--har-file', self.har_file, '--output', output, '--format', 'json')
+        with open(output) as f:
+            original = f.read()
+
+        # Appending YAML to a JSON spec, or consolidating it as YAML, is refused
+        self.run_main('--har-file', self.har_file, '--output', output, '--append')
+        self.run_main('--output', output, '--consolidate')
+        with open(output) as f:
+            self.assertEqual(f.read(), original)
+
+        self.run_main('--output', output, '--consolidate', '--format', 'json')
+        with open(output) as f:
+            self.assertEqual(json.load(f), json.loads(original))
+
+
+if __name__ == '__main__':
+    unittest.main()